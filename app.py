@@ -1,66 +1,70 @@
 # app.py
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
-from dash import Dash, dcc, html, Input, Output
+import os
 
-# ---------- LOAD DATA ----------
-df_poi_raw_jan = pd.read_csv("df_poi_raw_jan.csv")
-df_visits_cnty_geo = pd.read_csv("df_visits_cnty_geo.csv.gz", compression="gzip")
-
-# Make sure placekey is string and consistent
-df_poi_raw_jan["placekey"] = df_poi_raw_jan["placekey"].astype(str)
-df_visits_cnty_geo["placekey"] = df_visits_cnty_geo["placekey"].astype(str)
-
-# ---------- PRE-GROUP VISITS BY PLACEKEY (performance) ----------
-df_visits_small = df_visits_cnty_geo[[
-    "placekey", "county", "NAME", "lat", "lon", "visits"
-]].copy()
-
-df_visits_small["placekey"] = df_visits_small["placekey"].astype(str)
-df_visits_small["visits"] = df_visits_small["visits"].astype(float)
-
-visits_by_placekey = {
-    pk: grp.reset_index(drop=True)
-    for pk, grp in df_visits_small.groupby("placekey")
-}
-
-# ---------- BASE FIGURE (POI MAP) ----------
-base_fig = px.scatter_mapbox(
-    df_poi_raw_jan,
-    lat="latitude",
-    lon="longitude",
-    hover_name="location_name",  # becomes %{hovertext}
-    hover_data={},               # we control hover ourselves
-    zoom=3,
-)
-base_fig.update_layout(
-    mapbox_style="open-street-map",
-    margin={"r": 0, "t": 40, "l": 0, "b": 0},
-)
+import joblib
+import orjson
+import plotly.io as pio
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction, Patch, no_update
+from flask.json.provider import JSONProvider
 
-# customdata: [placekey, raw_visit_counts]
-poi_customdata = np.stack(
-    [
-        df_poi_raw_jan["placekey"].astype(str),
-        df_poi_raw_jan["raw_visit_counts"].astype(int),
-    ],
-    axis=-1,
-)
+from artifact_format import ARTIFACTS_PATH, ARTIFACT_VERSION
 
-base_fig.update_traces(
-    marker=dict(size=6, opacity=1.0),
-    customdata=poi_customdata,
-    name="Casinos",
-    hovertemplate=(
-        "<b>%{hovertext}</b><br>"
-        "Visitors: %{customdata[1]}<extra></extra>"
-    ),
-)
+# ---------- LOAD DATA ----------
+# All preprocessing lives in prepare_data.py, which writes a single artifact;
+# run `python prepare_data.py` before deploying and whenever the data changes.
+# Workers never build it themselves, they only load it. Loading skips the
+# CSV/Parquet parsing and indexing, but each worker still unpickles its own
+# copy of what it keeps (Python lists); mmap_mode only maps the few NumPy
+# arrays (base figure, dimmed opacities).
+if not os.path.exists(ARTIFACTS_PATH):
+    raise RuntimeError(
+        f"{ARTIFACTS_PATH} not found; run `python prepare_data.py` first."
+    )
+artifacts = joblib.load(ARTIFACTS_PATH, mmap_mode="r")
+if artifacts.get("version") != ARTIFACT_VERSION:
+    raise RuntimeError(
+        f"{ARTIFACTS_PATH} has format version {artifacts.get('version')}, "
+        f"expected {ARTIFACT_VERSION}; re-run `python prepare_data.py`."
+    )
 
-# ---------- DASH APP ----------
-app = Dash(__name__)
+# Clicks are handled in the browser by default; set CLIENTSIDE_CLICKS=0 to
+# fall back to the server callback (e.g. when the visits data gets too big
+# to ship to every client).
+CLIENTSIDE_CLICKS = os.environ.get("CLIENTSIDE_CLICKS", "1") != "0"
+
+# Keep only what this mode's click handler reads; the rest of the artifact
+# is freed once it is loaded.
+BASE_FIG_DICT = artifacts["BASE_FIG_DICT"]
+if CLIENTSIDE_CLICKS:
+    poi_store_data = artifacts["poi_store_data"]
+    visits_by_placekey_small = artifacts["visits_by_placekey_small"]
+else:
+    visits_by_placekey = artifacts["visits_by_placekey"]
+    traces_by_placekey = artifacts["traces_by_placekey"]
+    poi_meta = artifacts["poi_meta"]
+    BASE_OPACITIES_DIM = artifacts["BASE_OPACITIES_DIM"]
+del artifacts
+
+# ---------- JSON SERIALIZATION (performance) ----------
+# Dash encodes layouts and callback responses through plotly.io.json; pin it
+# to orjson (C encoder with native NumPy support) instead of stdlib json.
+pio.json.config.default_engine = "orjson"
+
+
+class ORJSONProvider(JSONProvider):
+    # Flask side: parses incoming callback bodies and backs jsonify
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+# gzip responses: with the client-side stores the layout is ~4 MB of JSON
+app = Dash(__name__, compress=True)
+app.server.json = ORJSONProvider(app.server)
 app.title = "Casino Visitor Origins"
 
 app.layout = html.Div(
@@ -76,86 +80,96 @@ app.layout = html.Div(
     ]),
         dcc.Graph(
             id="map",
-            figure=base_fig,
+            figure=BASE_FIG_DICT,
+            config={"responsive": True, "displaylogo": False},
             style={"height": "90vh"}
         ),
-        html.Div(id="info", style={"marginTop": "10px", "fontSize": "14px"})
+        html.Div(
+            "Click a casino to see visitor origin counties.",
+            id="info",
+            style={"marginTop": "10px", "fontSize": "14px"}
+        ),
+        dcc.Store(id="last-pk"),
     ]
 )
+if CLIENTSIDE_CLICKS:
+    app.layout.children += [
+        dcc.Store(id="poi-store", data=poi_store_data),
+        dcc.Store(id="visits-store", data=visits_by_placekey_small),
+    ]
 
 # ---------- CALLBACK ----------
-@app.callback(
-    Output("map", "figure"),
-    Output("info", "children"),
-    Input("map", "clickData"),
-)
-def update_map(clickData):
-    # start from base fig every time (this resets previous click state)
-    fig = go.Figure(base_fig)
-
-    if clickData is None:
-        return fig, "Click a casino to see visitor origin counties."
-
+def update_map(clickData, last_pk):
     point = clickData["points"][0]
     cd = point.get("customdata")
 
-    # customdata = [placekey, raw_visit_counts] or scalar
-    if isinstance(cd, (list, tuple)) and len(cd) > 0:
-        placekey_clicked = str(cd[0])
-        raw_visits = cd[1] if len(cd) > 1 else None
-    else:
-        placekey_clicked = str(cd)
-        raw_visits = None
+    # customdata = [row index] or scalar; county markers carry none
+    if cd is None:
+        return no_update, no_update, no_update
+    idx = int(cd[0] if isinstance(cd, list) else cd)
+    placekey_clicked = poi_meta.at[idx, "placekey"]
+    raw_visits = int(poi_meta.at[idx, "raw_visit_counts"])
 
-    # ----- dim other POIs -----
-    mask = df_poi_raw_jan["placekey"].astype(str) == placekey_clicked
-    opacities = [1.0 if m else 0.3 for m in mask]
-    fig.data[0].marker.opacity = opacities
+    # same POI clicked again: the map already shows it
+    if placekey_clicked == last_pk:
+        return no_update, no_update, no_update
 
-    # ----- county markers for this POI (fast dict lookup) -----
-    tmp = visits_by_placekey.get(placekey_clicked)
-    if tmp is None or tmp.empty:
+    # Only send what changes: the POI opacities and the county trace
+    # (data[1]), not the whole figure.
+    fig = Patch()
+
+    # ----- dim other POIs -----
+    opacities = BASE_OPACITIES_DIM.copy()
+    opacities[idx] = 1.0
+    fig["data"][0]["marker"]["opacity"] = opacities
+
+    # ----- county markers for this POI (precomputed) -----
+    trace = traces_by_placekey.get(placekey_clicked)
+    if trace is None:
+        del fig["data"][1]
         info_text = (
             f"Clicked placekey: {placekey_clicked} "
             f"(raw_visit_counts={raw_visits}). "
             "No county-level visitor data found for this POI."
         )
-        return fig, info_text
-
-    visits = tmp["visits"]
-    if visits.max() > 0:
-        sizes = 6 + 18 * (visits / visits.max())
-    else:
-        sizes = 8
-
-    fig.add_scattermapbox(
-    lat=tmp["lat"],
-    lon=tmp["lon"],
-    mode="markers",
-    marker=dict(
-        size=sizes,
-        opacity=0.7,
-        color="red",       # <--- add this
-    ),
-    name="Visitor counties",
-    hovertext=(
-        "County: " + tmp["NAME"].astype(str)
-        + "<br>FIPS: " + tmp["county"].astype(str)
-        + "<br>Visitors: " + tmp["visits"].astype(int).astype(str)
-    ),
-    hoverinfo="text",
-)
+        return fig, info_text, placekey_clicked
 
+    fig["data"][1] = trace
 
+    v = visits_by_placekey[placekey_clicked]
     info_text = (
         f"Clicked placekey: {placekey_clicked} "
         f"(raw_visit_counts={raw_visits}). "
-        f"Matched county rows: {len(tmp)}. "
-        f"Distinct origin counties: {tmp['county'].nunique()}, "
-        f"total visitors in sample: {int(tmp['visits'].sum())}."
+        f"Matched county rows: {v['stop'] - v['start']}. "
+        f"Distinct origin counties: {v['n_unique_county']}, "
+        f"total visitors in sample: {int(v['visits_sum'])}."
     )
 
-    return fig, info_text
+    return fig, info_text, placekey_clicked
+
+
+if CLIENTSIDE_CLICKS:
+    app.clientside_callback(
+        ClientsideFunction(namespace="casino", function_name="onClick"),
+        Output("map", "figure"),
+        Output("info", "children"),
+        Output("last-pk", "data"),
+        Input("map", "clickData"),
+        State("last-pk", "data"),
+        State("poi-store", "data"),
+        State("visits-store", "data"),
+        State("map", "figure"),
+        prevent_initial_call=True,
+    )
+else:
+    app.callback(
+        Output("map", "figure"),
+        Output("info", "children"),
+        Output("last-pk", "data"),
+        Input("map", "clickData"),
+        State("last-pk", "data"),
+        prevent_initial_call=True,
+    )(update_map)
 
 
 if __name__ == "__main__":
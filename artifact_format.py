@@ -0,0 +1,9 @@
+# artifact_format.py
+# Where prepare_data.py writes its artifact and which layout it has. Kept
+# free of heavy imports so app.py can read it without loading pandas/plotly
+# express machinery it does not need.
+ARTIFACTS_PATH = "artifacts.joblib"
+
+# Bump whenever prepare_data.py changes what it writes; app.py refuses to
+# load an artifact written with a different version.
+ARTIFACT_VERSION = 3
@@ -0,0 +1,76 @@
+// assets/casino.js
+// Client-side version of update_map: looks the clicked placekey up in the
+// visits-store and patches the figure in the browser, so a click never
+// round-trips to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    casino: {
+        onClick: function (clickData, lastPk, poiMeta, visitsByPlacekey, figure) {
+            const noUpdate = window.dash_clientside.no_update;
+            const point = clickData.points[0];
+            const cd = point.customdata;
+
+            // customdata = [row index] or scalar; county markers carry none
+            if (cd === undefined || cd === null) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            const idx = Array.isArray(cd) ? cd[0] : cd;
+            const placekeyClicked = poiMeta.placekey[idx];
+            const rawVisits = poiMeta.raw_visit_counts[idx];
+
+            // same POI clicked again: the map already shows it
+            if (placekeyClicked === lastPk) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+
+            // ----- dim other POIs -----
+            const poi = Object.assign({}, figure.data[0]);
+            const nPoi = poi.lat.length;
+            const opacities = new Array(nPoi).fill(0.3);
+            opacities[idx] = 1.0;
+            poi.marker = Object.assign({}, poi.marker, {opacity: opacities});
+
+            const fig = Object.assign({}, figure, {data: [poi]});
+
+            // ----- county markers for this POI -----
+            const v = visitsByPlacekey[placekeyClicked];
+            if (!v) {
+                return [
+                    fig,
+                    `Clicked placekey: ${placekeyClicked} ` +
+                    `(raw_visit_counts=${rawVisits}). ` +
+                    "No county-level visitor data found for this POI.",
+                    placekeyClicked
+                ];
+            }
+
+            const sizes = v.visits_max > 0
+                ? v.visits.map(x => 6 + 18 * x * v.inv_vmax)
+                : 8;
+            const hovertext = v.visits.map((x, i) =>
+                `County: ${v.name[i]}<br>FIPS: ${v.county[i]}<br>Visitors: ${Math.trunc(x)}`
+            );
+
+            fig.data.push({
+                type: "scattermapbox",
+                lat: v.lat,
+                lon: v.lon,
+                mode: "markers",
+                marker: {size: sizes, opacity: 0.7, color: "red"},
+                name: "Visitor counties",
+                uid: "counties",
+                hovertext: hovertext,
+                hoverinfo: "text"
+            });
+
+            return [
+                fig,
+                `Clicked placekey: ${placekeyClicked} ` +
+                `(raw_visit_counts=${rawVisits}). ` +
+                `Matched county rows: ${v.visits.length}. ` +
+                `Distinct origin counties: ${v.n_unique_county}, ` +
+                `total visitors in sample: ${Math.trunc(v.visits_sum)}.`,
+                placekeyClicked
+            ];
+        }
+    }
+});
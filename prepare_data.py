@@ -0,0 +1,235 @@
+# prepare_data.py
+# One-shot preprocessing for app.py: reads the raw data, builds every lookup
+# table and the base figure, and writes them to a single joblib artifact.
+# Run `python prepare_data.py` again whenever the input data changes.
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from artifact_format import ARTIFACTS_PATH, ARTIFACT_VERSION
+
+
+def write_atomically(path, write):
+    # write beside the target and rename it into place, so a concurrent
+    # reader never sees a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# ---------- LOAD DATA ----------
+# The raw CSVs are converted to Parquet (placekey dictionary-encoded) and
+# reconverted whenever the CSV is newer; other runs read the columnar files
+# and skip text/gzip parsing.
+POI_COLUMNS = ["placekey", "location_name", "latitude", "longitude", "raw_visit_counts"]
+VISITS_COLUMNS = ["placekey", "county", "NAME", "lat", "lon", "visits"]
+
+
+def load_parquet(csv_path, parquet_path, columns, **read_csv_kwargs):
+    if (
+        not os.path.exists(parquet_path)
+        or os.path.getmtime(csv_path) > os.path.getmtime(parquet_path)
+    ):
+        df = pd.read_csv(csv_path, **read_csv_kwargs)
+        df["placekey"] = df["placekey"].astype("category")
+        write_atomically(
+            parquet_path,
+            lambda path: df.to_parquet(path, engine="pyarrow", compression="zstd"),
+        )
+    return pd.read_parquet(parquet_path, engine="pyarrow", columns=columns)
+
+
+def load_visits():
+    df = load_parquet(
+        "df_visits_cnty_geo.csv.gz", "df_visits_cnty_geo.parquet", VISITS_COLUMNS,
+        compression="gzip",
+    )
+
+    # Narrow dtypes: float32/int32 numbers and categorical strings halve the
+    # bytes moved through the sort and every later column access.
+    for c in ("lat", "lon"):
+        df[c] = df[c].astype("float32")
+    df["visits"] = df["visits"].astype("int32")
+    for c in ("placekey", "NAME", "county"):
+        df[c] = df[c].astype("category")
+    return df
+
+
+# ---------- INDEX VISITS BY PLACEKEY ----------
+def index_visits(df):
+    # One contiguous table sorted by placekey: each placekey maps to its
+    # (start, stop) rows plus precomputed stats, and consumers slice the
+    # column arrays (views, no copies) instead of holding a DataFrame per POI.
+    # Rows without a placekey (category code -1) belong to no POI and are
+    # dropped before the group boundaries are computed.
+    df = df[df["placekey"].notna()]
+    df = df.sort_values("placekey", kind="stable").reset_index(drop=True)
+
+    cols = {
+        "lat": df["lat"].to_numpy(),
+        "lon": df["lon"].to_numpy(),
+        "visits": df["visits"].to_numpy(dtype=np.float32),
+        "name": df["NAME"].to_numpy().astype(str),
+        "county": df["county"].to_numpy().astype(str),
+    }
+
+    codes = df["placekey"].cat.codes.to_numpy()
+    starts = np.concatenate([[0], np.flatnonzero(codes[1:] != codes[:-1]) + 1])
+    stops = np.append(starts[1:], len(codes))
+
+    # distinct counties per placekey straight from the dictionary codes:
+    # unique (placekey, county) code pairs, counted per placekey code
+    n_counties = len(df["county"].cat.categories)
+    county_codes = df["county"].cat.codes.to_numpy().astype(np.int64)
+    has_county = county_codes >= 0
+    pairs = np.unique(
+        codes[has_county].astype(np.int64) * n_counties + county_codes[has_county]
+    )
+    n_unique_county = np.bincount(
+        pairs // n_counties, minlength=len(df["placekey"].cat.categories)
+    )
+
+    visits_by_placekey = {
+        pk: {
+            "start": int(s),
+            "stop": int(e),
+            "visits_max": float(vmax),
+            "visits_sum": int(vsum),
+            "n_unique_county": int(nuc),
+            # marker sizing multiplies by this instead of dividing by max
+            "inv_vmax": 1.0 / max(1.0, float(vmax)),
+        }
+        for pk, s, e, nuc, vmax, vsum in zip(
+            df["placekey"].cat.categories[codes[starts]],
+            starts,
+            stops,
+            n_unique_county[codes[starts]],
+            np.maximum.reduceat(cols["visits"], starts),
+            np.add.reduceat(df["visits"].to_numpy(dtype=np.int64), starts),
+        )
+    }
+    return cols, visits_by_placekey
+
+
+# precomputed stats the client-side handler reads instead of re-reducing
+STORE_STATS = ("visits_max", "visits_sum", "n_unique_county", "inv_vmax")
+
+
+# ---------- COUNTY TRACES ----------
+# A ready-to-send scattermapbox trace per placekey, so a click is a single
+# dict lookup.
+def build_county_trace(v, cols):
+    rows = slice(v["start"], v["stop"])
+    visits = cols["visits"][rows]
+    if v["visits_max"] > 0:
+        sizes = (6 + 18 * visits * v["inv_vmax"]).tolist()
+    else:
+        sizes = 8
+
+    return {
+        "type": "scattermapbox",
+        "lat": cols["lat"][rows].tolist(),
+        "lon": cols["lon"][rows].tolist(),
+        "mode": "markers",
+        "marker": {
+            "size": sizes,
+            "opacity": 0.7,
+            "color": "red",
+        },
+        "name": "Visitor counties",
+        "uid": "counties",
+        "hovertext": [
+            f"County: {name}<br>FIPS: {county}<br>Visitors: {int(n)}"
+            for name, county, n in zip(cols["name"][rows], cols["county"][rows], visits)
+        ],
+        "hoverinfo": "text",
+    }
+
+
+# ---------- BASE FIGURE (POI MAP) ----------
+def build_base_figure(df_poi):
+    # scattermapbox is drawn by mapbox-gl on WebGL (the open-street-map
+    # raster tiles included), so POI count costs GPU points, not DOM nodes;
+    # at ~2k POIs a Datashader tile overlay would not pay for itself.
+    base_fig = px.scatter_mapbox(
+        df_poi,
+        lat="latitude",
+        lon="longitude",
+        hover_name="location_name",  # becomes %{hovertext}
+        hover_data={},               # we control hover ourselves
+        zoom=3,
+    )
+    base_fig.update_layout(
+        mapbox_style="open-street-map",
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+        # constant uirevision + stable trace uids: click updates keep the
+        # user's zoom/pan and Plotly diffs data instead of remounting the map
+        uirevision="static",
+    )
+
+    # customdata: [row index into poi_meta]; text: raw_visit_counts
+    poi_customdata = np.arange(len(df_poi), dtype=np.int32)[:, None]
+
+    base_fig.update_traces(
+        marker=dict(size=6, opacity=1.0),
+        customdata=poi_customdata,
+        text=df_poi["raw_visit_counts"].astype(int),
+        name="Casinos",
+        uid="poi",
+        hovertemplate=(
+            "<b>%{hovertext}</b><br>"
+            "Visitors: %{text}<extra></extra>"
+        ),
+    )
+    return base_fig
+
+
+def build_artifacts():
+    df_poi_raw_jan = load_parquet(
+        "df_poi_raw_jan.csv", "df_poi_raw_jan.parquet", POI_COLUMNS
+    )
+    cols, visits_by_placekey = index_visits(load_visits())
+
+    # The POI trace carries only its row number as customdata; placekey and
+    # raw visit count are looked up in poi_meta.
+    poi_meta = df_poi_raw_jan[["placekey", "raw_visit_counts"]].reset_index(drop=True)
+
+    return {
+        "version": ARTIFACT_VERSION,
+        "visits_by_placekey": visits_by_placekey,
+        "traces_by_placekey": {
+            pk: build_county_trace(v, cols) for pk, v in visits_by_placekey.items()
+        },
+        # same data as plain lists plus the per-placekey stats, shipped once
+        # to the browser for the client-side click handler (assets/casino.js)
+        "visits_by_placekey_small": {
+            pk: {
+                **{k: a[v["start"]:v["stop"]].tolist() for k, a in cols.items()},
+                **{k: v[k] for k in STORE_STATS},
+            }
+            for pk, v in visits_by_placekey.items()
+        },
+        "poi_meta": poi_meta,
+        "poi_store_data": {
+            "placekey": poi_meta["placekey"].tolist(),
+            "raw_visit_counts": poi_meta["raw_visit_counts"].astype(int).tolist(),
+        },
+        # "everything dimmed" opacities that a click copies and lights up
+        # one entry of
+        "BASE_OPACITIES_DIM": np.full(len(df_poi_raw_jan), 0.3, dtype=np.float32),
+        "BASE_FIG_DICT": build_base_figure(df_poi_raw_jan).to_dict(),
+    }
+
+
+def main():
+    artifacts = build_artifacts()
+    write_atomically(
+        ARTIFACTS_PATH, lambda path: joblib.dump(artifacts, path, compress=0)
+    )
+
+
+if __name__ == "__main__":
+    main()